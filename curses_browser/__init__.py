@@ -0,0 +1,5 @@
+import time
+
+# Startup profile reference point, taken before any submodule is imported
+perf_counter = getattr(time, "perf_counter", time.time)
+_IMPORT_START = perf_counter()
@@ -0,0 +1,473 @@
+"""Asyncio event loop for plan menu and async data sources."""
+
+import asyncio
+import curses
+import os
+import signal
+import subprocess
+import sys
+
+from curses_browser.viewer import DictEntry, PlanMenu, shorten
+
+
+READ_SIZE = 65536
+BATCH_SIZE = 512
+
+
+def decode_line(line):
+    """Decode line bytes and strip line ending."""
+    return line.decode("utf-8", "replace").rstrip("\r")
+
+
+def parse_entry(line):
+    """Default line parser: make checkable entry with line as text."""
+    return DictEntry({"text": decode_line(line)}, False, "[{checked}] {text}")
+
+
+async def line_batches(reader, parse=parse_entry, batch_size=BATCH_SIZE):
+    """Yield lists of parsed lines as soon as data arrives.
+
+    Everything available in reader is taken at once, so a batch holds all
+    complete lines received so far, up to batch_size.
+
+    :param reader: stream to read from
+    :type reader: asyncio.StreamReader
+
+    :param parse: callable making an entry from line bytes
+    :type parse: callable
+
+    :param batch_size: maximum number of entries in batch
+    :type batch_size: int
+    """
+    tail = b""
+    while True:
+        data = await reader.read(READ_SIZE)
+        if not data:
+            break
+        lines = (tail + data).split(b"\n")
+        tail = lines.pop()
+        for start in range(0, len(lines), batch_size):
+            yield [parse(line) for line in lines[start:start + batch_size]]
+    if tail:
+        yield [parse(tail)]
+
+
+async def unix_socket_source(path, parse=parse_entry, batch_size=BATCH_SIZE):
+    """Yield batches of entries read line by line from Unix socket.
+
+    :param path: socket path
+    :type path: str
+    """
+    reader, writer = await asyncio.open_unix_connection(path)
+    try:
+        async for batch in line_batches(reader, parse, batch_size):
+            yield batch
+    finally:
+        writer.close()
+
+
+async def subprocess_source(args, parse=parse_entry, batch_size=BATCH_SIZE):
+    """Yield batches of entries read line by line from process's stdout.
+
+    :param args: program and its arguments
+    :type args: list
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=subprocess.PIPE)
+    try:
+        async for batch in line_batches(process.stdout, parse, batch_size):
+            yield batch
+    finally:
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+
+
+async def feed(dframe, source):
+    """Append every batch from async source to DataFrame.
+
+    :param dframe: data frame to feed
+    :type dframe: DataFrame
+
+    :param source: async iterable of entry batches
+
+    :return: number of appended entries
+    :rtype: int
+    """
+    count = 0
+    async for batch in source:
+        dframe.extend(batch)
+        count += len(batch)
+    return count
+
+
+class AsyncPlanMenu(PlanMenu):
+    """Plan menu driven by asyncio event loop.
+
+    Stdin is registered with the loop for key events, data sources run as
+    tasks feeding DataFrame, and rendering is scheduled at most once per
+    FRAME_INTERVAL instead of polling.
+    """
+
+    FRAME_INTERVAL = PlanMenu.SLEEP_TIME
+    KEYS_BACKSPACE = (curses.KEY_BACKSPACE, 127, 8)
+
+    def __init__(self, data, filename, columns=None, sources=()):
+        super(AsyncPlanMenu, self).__init__(data, filename, columns)
+        self._sources = list(sources)
+        self._aloop = None
+        self._done = None
+        self._render_handle = None
+        self._last_render = 0.0
+        # Search text being typed, None when not prompting
+        self._input = None
+
+    def _call(self, func):
+        """Run loop callback, stopping menu if it raises."""
+        try:
+            func()
+        except Exception as exc:
+            if not self._done.done():
+                self._done.set_exception(exc)
+
+    def _schedule_render(self):
+        """Render on next frame boundary unless already scheduled."""
+        if self._render_handle is None:
+            delay = max(
+                0.0,
+                self._last_render + self.FRAME_INTERVAL - self._aloop.time())
+            self._render_handle = self._aloop.call_later(
+                delay, self._call, self._render_frame)
+
+    def _render_frame(self):
+        """Redraw screen."""
+        self._render_handle = None
+        self._last_render = self._aloop.time()
+        self.update()
+        self.render()
+        # Footer message fades out by frame counter, keep ticking
+        if self._message["msg"]:
+            self._schedule_render()
+
+    def _edit_input(self, keycode):
+        """Edit search text without blocking the loop.
+
+        :param keycode: curses key code
+        :type keycode: int
+        """
+        if keycode == self.KEY_ENTER:
+            text, self._input = self._input, None
+            self.search(text)
+        elif keycode == self.KEY_ESC:
+            self._input = None
+        elif keycode in self.KEYS_BACKSPACE:
+            self._input = self._input[:-1]
+        elif keycode == curses.KEY_RESIZE:
+            self._handle_key(keycode)
+        elif 32 <= keycode < 127:
+            self._input += chr(keycode)
+
+    def _on_input(self):
+        """Handle all pending key events."""
+        keycode = self._screen.getch()
+        while keycode != -1:
+            if self._input is not None:
+                self._edit_input(keycode)
+            elif keycode == self.KEY_SEARCH:
+                # PlanMenu's prompt blocks in getstr(), type into footer
+                self._input = ""
+            else:
+                self._handle_key(keycode)
+            keycode = self._screen.getch()
+        if not self._running:
+            if not self._done.done():
+                self._done.set_result(None)
+            return
+        self._schedule_render()
+
+    def _on_winch(self):
+        """Handle terminal resize.
+
+        Loop's signal handler replaces one of curses, so curses is told
+        about new size here; it queues KEY_RESIZE for _on_input().
+        """
+        size = os.get_terminal_size(sys.stdin.fileno())
+        curses.resizeterm(size.lines, size.columns)
+        self._on_input()
+
+    def _update_footer(self):
+        """Update box's footer, showing search text while it is typed."""
+        if self._input is None:
+            super(AsyncPlanMenu, self)._update_footer()
+            return
+        self._box.addstr(self._max_y, 1, " " * self._max_x)
+        self._box.addstr(
+            self._max_y, 2, shorten("/" + self._input, self._max_x - 2))
+
+    async def _feed(self, source):
+        """Feed DataFrame from source, redrawing after each batch."""
+        try:
+            async for batch in source:
+                self._dframe.extend(batch)
+                self._schedule_render()
+        except Exception as exc:
+            self._error("Source failed: {0}".format(exc))
+            self._schedule_render()
+
+    async def _load_and_feed(self):
+        """Load pending data in batches, then feed from sources.
+
+        Sources start only after initial data is loaded, so their entries
+        follow it instead of being interleaved with it.
+        """
+        while self._load(self.LOAD_BATCH):
+            self._schedule_render()
+            await asyncio.sleep(0)
+        self._schedule_render()
+        await asyncio.gather(*(self._feed(source) for source in self._sources))
+
+    def add_source(self, source):
+        """Add async data source, started with the loop.
+
+        :param source: async iterable of entry batches
+        """
+        self._sources.append(source)
+
+    async def run(self):
+        """Run menu until exit."""
+        self._aloop = asyncio.get_running_loop()
+        self._done = self._aloop.create_future()
+        fileno = sys.stdin.fileno()
+        self._aloop.add_reader(fileno, self._call, self._on_input)
+        self._aloop.add_signal_handler(
+            signal.SIGWINCH, self._call, self._on_winch)
+        task = asyncio.ensure_future(self._load_and_feed())
+        self._schedule_render()
+        try:
+            await self._done
+        finally:
+            self._aloop.remove_reader(fileno)
+            self._aloop.remove_signal_handler(signal.SIGWINCH)
+            if self._render_handle is not None:
+                self._render_handle.cancel()
+                self._render_handle = None
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _run(self):
+        """Run asyncio event loop until stopped."""
+        asyncio.run(self.run())
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    import unittest
+    from unittest import mock
+
+    from curses_browser.dataframe import DataFrame
+
+    class LocalSocketServer(object):
+        """Unix socket server writing given lines to every client.
+
+        Usage: async with LocalSocketServer(lines) as server: server.path
+        Lines are written in chunks of chunk_size lines; if hold is set,
+        connection stays open after writing until hold is released.
+        """
+        def __init__(self, lines, chunk_size=100, hold=None):
+            self.lines = lines
+            self.chunk_size = chunk_size
+            self.hold = hold
+            self.path = None
+            self._tmpdir = None
+            self._server = None
+
+        async def _handle(self, reader, writer):
+            for start in range(0, len(self.lines), self.chunk_size):
+                chunk = self.lines[start:start + self.chunk_size]
+                writer.write(b"".join(line + b"\n" for line in chunk))
+                await writer.drain()
+            if self.hold is not None:
+                await self.hold.wait()
+            writer.close()
+
+        async def __aenter__(self):
+            self._tmpdir = tempfile.mkdtemp()
+            self.path = os.path.join(self._tmpdir, "results.sock")
+            self._server = await asyncio.start_unix_server(
+                self._handle, path=self.path)
+            return self
+
+        async def __aexit__(self, *exc_info):
+            self._server.close()
+            await self._server.wait_closed()
+            shutil.rmtree(self._tmpdir)
+
+    class TestSources(unittest.TestCase):
+        """Async data sources."""
+        def test_socket(self):
+            """All lines arrive in bounded batches."""
+            lines = [str(idx).encode() for idx in range(2000)]
+
+            async def run():
+                async with LocalSocketServer(lines) as server:
+                    batches = []
+                    async for batch in unix_socket_source(
+                            server.path, decode_line, batch_size=300):
+                        batches.append(batch)
+                    return batches
+
+            batches = asyncio.run(run())
+            self.assertTrue(all(0 < len(batch) <= 300 for batch in batches))
+            self.assertEqual(
+                sum(batches, []), [line.decode() for line in lines])
+
+        def test_partial(self):
+            """Received lines are fed before connection is closed."""
+            async def run():
+                hold = asyncio.Event()
+                server = LocalSocketServer([b"a", b"b"], hold=hold)
+                async with server:
+                    dframe = DataFrame()
+                    task = asyncio.ensure_future(feed(
+                        dframe, unix_socket_source(server.path, decode_line)))
+                    while len(dframe) < 2:
+                        await asyncio.sleep(0.01)
+                    self.assertFalse(task.done())
+                    hold.set()
+                    self.assertEqual(await task, 2)
+                    return dframe
+
+            self.assertEqual(asyncio.run(run()), ["a", "b"])
+
+        def test_subprocess(self):
+            """Process's stdout feeds DataFrame."""
+            args = [sys.executable, "-c", "print('x\\ny')"]
+            dframe = DataFrame()
+            count = asyncio.run(feed(dframe, subprocess_source(args)))
+            self.assertEqual(count, 2)
+            self.assertEqual(
+                [str(entry) for entry in dframe], ["[ ] x", "[ ] y"])
+
+    class StubWindow(object):
+        """Curses window stub: drawing does nothing, getch() returns keys."""
+        def __init__(self, *args):
+            self.keys = []
+
+        def getch(self):
+            return self.keys.pop(0) if self.keys else -1
+
+        def getmaxyx(self):
+            return (24, 80)
+
+        def __getattr__(self, name):
+            return lambda *args: None
+
+    def entries(count, name="row"):
+        """Make entries like parse_entry() does."""
+        return [DictEntry({"text": "{0} {1}".format(name, idx)}, False,
+                          "[{checked}] {text}") for idx in range(count)]
+
+    class TestAsyncPlanMenu(unittest.TestCase):
+        """Menu on event loop, with stub windows instead of terminal."""
+        def setUp(self):
+            for patcher in (
+                    mock.patch("curses_browser.viewer.init_curses",
+                               StubWindow),
+                    mock.patch("curses.newwin", StubWindow),
+                    mock.patch("curses.color_pair", return_value=0)):
+                patcher.start()
+                self.addCleanup(patcher.stop)
+
+        def start(self, menu):
+            """Prepare menu's loop state as run() does, without stdin."""
+            menu._aloop = asyncio.get_running_loop()
+            menu._done = menu._aloop.create_future()
+            menu._running = True
+
+        def stop(self, menu):
+            """Cancel pending render."""
+            if menu._render_handle is not None:
+                menu._render_handle.cancel()
+
+        def test_keys(self):
+            """All pending keys are handled, search is typed into footer."""
+            data = entries(5)
+
+            async def run():
+                menu = AsyncPlanMenu(data, None)
+                self.start(menu)
+                menu._screen.keys = [
+                    curses.KEY_DOWN, menu.KEY_SPACE, menu.KEY_SEARCH,
+                    ord("3"), ord("x"), 127, menu.KEY_ENTER]
+                menu._on_input()
+                self.assertEqual(menu._screen.keys, [])
+                self.assertEqual(menu._input, None)
+                self.assertEqual(menu._highlighter.pattern, "3")
+                self.assertIsNotNone(menu._render_handle)
+                self.assertFalse(menu._done.done())
+                menu._screen.keys = [
+                    menu.KEY_ENTER, menu.KEY_SPACE, menu.KEY_ESC]
+                menu._on_input()
+                self.assertTrue(menu._done.done())
+                self.stop(menu)
+
+            asyncio.run(run())
+            self.assertEqual(
+                [entry.checked for entry in data],
+                [False, False, True, False, False])
+
+        def test_throttle(self):
+            """Rendering happens at most once per FRAME_INTERVAL."""
+            async def run():
+                menu = AsyncPlanMenu(entries(5), None)
+                menu.FRAME_INTERVAL = 0.05
+                self.start(menu)
+                frames = []
+                menu.render = lambda: frames.append(menu._aloop.time())
+                end = menu._aloop.time() + 0.3
+                while menu._aloop.time() < end:
+                    menu._schedule_render()
+                    await asyncio.sleep(0.001)
+                self.stop(menu)
+                return frames, menu.FRAME_INTERVAL
+
+            frames, interval = asyncio.run(run())
+            self.assertTrue(2 <= len(frames) <= 7, frames)
+            for prev, cur in zip(frames, frames[1:]):
+                self.assertGreater(cur - prev, interval * 0.9)
+
+        def test_source(self):
+            """Source rows follow initial rows and can be checked and saved."""
+            lines = [str(idx).encode() for idx in range(50)]
+            tmpdir = tempfile.mkdtemp()
+            filename = os.path.join(tmpdir, "saved.txt")
+
+            async def run():
+                async with LocalSocketServer(lines, chunk_size=7) as server:
+                    menu = AsyncPlanMenu(
+                        iter(entries(30, "initial")), filename,
+                        sources=[unix_socket_source(server.path)])
+                    menu.LOAD_BATCH = 4
+                    self.start(menu)
+                    await menu._load_and_feed()
+                    # Second page starts at 19th row, third one at 38th
+                    menu._screen.keys = [
+                        curses.KEY_RIGHT, curses.KEY_RIGHT, menu.KEY_SPACE,
+                        curses.KEY_F5]
+                    menu._on_input()
+                    self.stop(menu)
+                    return menu
+
+            try:
+                menu = asyncio.run(run())
+                self.assertEqual(
+                    [entry.cells(["text"])[0] for entry in menu._dframe],
+                    ["initial {0}".format(idx) for idx in range(30)] +
+                    [line.decode() for line in lines])
+                with open(filename) as file_:
+                    self.assertEqual(file_.read(), "[*] 8\n")
+            finally:
+                shutil.rmtree(tmpdir)
+
+    unittest.main()
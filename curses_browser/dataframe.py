@@ -7,30 +7,159 @@ try:
 except NameError:
     pass
 
+# Low level lock, threading module is not needed at startup
+try:
+    from _thread import allocate_lock
+except ImportError:
+    from thread import allocate_lock
+
+
+class StoreView(object):
+    """Read-only snapshot of EntryStore published rows.
+    View shares chunks with the store, but its length is fixed, so rows
+    appended after the snapshot was taken are never visible through it.
+    """
+    def __init__(self, chunks, length, chunk_size):
+        self._chunks = chunks
+        self._length = length
+        self._chunk_size = chunk_size
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("view index out of range")
+        chunk, offset = divmod(index, self._chunk_size)
+        return self._chunks[chunk][offset]
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self[index]
 
-class DataFrame(list):
-    """Data represents as granulated list of lists.
-    DataFrame is a list, thus you can access elements directly like
-    with original list structure: dataframe[index] -> element
-    Also you can granulate (more than once) list of frames by frame length
+
+class EntryStore(object):
+    """Append-only chunked storage for concurrent producers and readers.
+    Producers write rows into preallocated chunks under a lock and then
+    publish them by assigning length counter, which is atomic.
+    Readers take a snapshot of published length without locking and never
+    see rows that are not completely written.
+    Internals:
+        _chunks: list of fixed size lists, only the last one is partial
+        _length: number of published rows
+        _lock: serializes producers
+    """
+
+    CHUNK_SIZE = 1024
+
+    def __init__(self, iterable=(), chunk_size=None):
+        self._chunk_size = chunk_size or self.CHUNK_SIZE
+        self._chunks = []
+        self._length = 0
+        self._lock = allocate_lock()
+        self.extend(iterable)
+
+    def extend(self, iterable):
+        """Append rows, publishing each completed chunk and the tail.
+        Iterable is consumed before the lock is taken, so a slow producer
+        does not block other ones.
+        :param iterable: rows to append
+        """
+        rows = list(iterable)
+        with self._lock:
+            length = self._length
+            for row in rows:
+                chunk, offset = divmod(length, self._chunk_size)
+                if chunk == len(self._chunks):
+                    self._chunks.append([None] * self._chunk_size)
+                self._chunks[chunk][offset] = row
+                length += 1
+                if offset == self._chunk_size - 1:
+                    self._length = length
+            self._length = length
+
+    def append(self, row):
+        """Append single row.
+        :param row: row to append
+        """
+        self.extend((row,))
+
+    def snapshot(self):
+        """Return view of currently published rows.
+        :rtype: StoreView
+        """
+        return StoreView(self._chunks, self._length, self._chunk_size)
+
+    def __len__(self):
+        return self._length
+
+
+class DataFrame(object):
+    """Data represents as granulated sequence of frames.
+    DataFrame behaves like a read-only list, thus you can access elements
+    directly: dataframe[index] -> element
+    Also you can granulate (more than once) data by frame length
     Default representation: DataFrame([1, 2, 3]) -> [[1], [2], [3]]
     Granulate by 2: DataFrame([1, 2, 3]).granulate(2) -> [[1, 2], [3]]
+    Data is kept in append-only EntryStore, so producers may append() and
+    extend() from other threads while UI thread reads and pages it.
+    Each paging operation works on a single store snapshot.
     Internals:
-        _frames: a list of lists, each frame is slice of data with
-            frame length
-        _findex: index of current frame (_frames[_findex])
+        _store: EntryStore with data
+        _findex: index of current frame
         _index: index of current element (self[_index])
         _flen: length of frame
     """
-    def __init__(self, *args, **kwargs):
-        super(self.__class__, self).__init__(*args, **kwargs)
-        self._frames = [[frame] for frame in self]
-        self._findex = 0 if self._frames else None
-        self._index = 0 if self._frames else None
+    def __init__(self, iterable=()):
+        self._store = EntryStore(iterable)
+        self._findex = None
+        self._index = None
         self._flen = 1
+        self._snapshot()
+
+    def _snapshot(self):
+        """Take store snapshot, setting indexes once data appears.
+        Only for paging methods, which are called from UI thread.
+        :rtype: StoreView
+        """
+        view = self._store.snapshot()
+        if self._index is None and len(view):
+            self._findex = 0
+            self._index = 0
+        return view
+
+    def _frames_count(self, view):
+        return int(math.ceil(len(view) / float(self._flen)))
+
+    def _frame(self, view):
+        start = self._findex * self._flen
+        return view[start:start + self._flen]
+
+    def append(self, element):
+        """Append element, safe to call from any thread.
+        :param element: element to append
+        """
+        self._store.append(element)
+
+    def extend(self, iterable):
+        """Append elements, safe to call from any thread.
+        :param iterable: elements to append
+        """
+        self._store.extend(iterable)
+
+    def snapshot(self):
+        """Return consistent read-only view of data.
+        Safe to call from any thread, paging state is not touched.
+        :rtype: StoreView
+        """
+        return self._store.snapshot()
 
     def granulate(self, length):
-        """Granulate list by frames (lists) of a given length.
+        """Granulate data by frames (lists) of a given length.
         :param length: length for granulating
         :type length: int
         """
@@ -38,14 +167,8 @@ class DataFrame(list):
             return
 
         self._flen = length
-        frame_count = int(math.ceil(len(self) / float(length)))
         #TODO: Recalculate findex (index will be the same)
-        new_findex = 0
-        frames = []
-        for frame in range(frame_count):
-            frames.append(self[frame * length:frame * length + length])
-        self._frames = frames
-        self._findex = new_findex
+        self._findex = 0
         self._index = 0  # temporary
 
     def move_next(self, step=1):
@@ -55,12 +178,13 @@ class DataFrame(list):
         :return: next element if that element exists, None otherwise
         :rtype: object or None
         """
-        if self._index is not None and len(self) > self._index + step:
+        view = self._snapshot()
+        if self._index is not None and len(view) > self._index + step:
             self._index += step
             # if index >= end index of current frame --> recalculate findex
             if self._index >= self._findex * self._flen + self._flen:
                 self._findex += int(math.ceil(step / float(self._flen)))
-            return self[self._index]
+            return view[self._index]
         return None
 
     def move_prev(self, step=1):
@@ -70,12 +194,13 @@ class DataFrame(list):
         :return: previous element if that element exists, None otherwise
         :rtype: object or None
         """
+        view = self._snapshot()
         if self._index is not None and self._index - step >= 0:
             self._index -= step
             # if index <= start index of current frame --> recalculate findex
             if self._index < self._findex * self._flen:
                 self._findex -= int(math.ceil(step / float(self._flen)))
-            return self[self._index]
+            return view[self._index]
         return None
 
     def next_frame(self, save_index=True):
@@ -83,17 +208,20 @@ class DataFrame(list):
         :return: next frame if that frame exists, None otherwise
         :rtype: list or None
         """
-        if len(self._frames) > self._findex + 1:
+        view = self._snapshot()
+        if self._findex is not None and \
+                self._frames_count(view) > self._findex + 1:
             self._findex += 1
             frame_start = self._findex * self._flen
+            frame = self._frame(view)
             if not save_index:
                 self._index = frame_start
             else:
-                if self._index + self._flen <= len(self) - 1 and save_index:
+                if self._index + self._flen <= len(view) - 1 and save_index:
                     self._index += self._flen
                 else:
-                    self._index = frame_start + len(self.frame) - 1
-            return self._frames[self._findex]
+                    self._index = frame_start + len(frame) - 1
+            return frame
         return None
 
     def prev_frame(self, save_index=True):
@@ -101,14 +229,15 @@ class DataFrame(list):
         :return: previous frame if that frame exists, None otherwise
         :rtype: list or None
         """
-        if self._findex > 0:
+        view = self._snapshot()
+        if self._findex:
             self._findex -= 1
             frame_end = self._findex * self._flen + self._flen -1
             if not save_index:
                 self._index = frame_end
             else:
                 self._index -= self._flen
-            return self._frames[self._findex]
+            return self._frame(view)
         return None
 
     def frames_count(self):
@@ -116,7 +245,7 @@ class DataFrame(list):
         :return: number of frames
         :rtype: int
         """
-        return len(self._frames)
+        return self._frames_count(self._store.snapshot())
 
     @property
     def frame(self):
@@ -124,7 +253,8 @@ class DataFrame(list):
         :return: current frame if len(self) > 0, empty list otherwise
         :rtype: list
         """
-        return self._frames[self._findex] if self._frames else []
+        view = self._snapshot()
+        return self._frame(view) if len(view) else []
 
     @property
     def frame_index(self):
@@ -132,6 +262,7 @@ class DataFrame(list):
         :return: current frame index
         :rtype: integer or None
         """
+        self._snapshot()
         return self._findex
 
     @property
@@ -140,7 +271,8 @@ class DataFrame(list):
         :return: current element if exists, None otherwise
         :rtype: object or None
         """
-        return self[self._index] if self._index is not None else None
+        view = self._snapshot()
+        return view[self._index] if self._index is not None else None
 
     @property
     def element_index(self):
@@ -148,10 +280,36 @@ class DataFrame(list):
         :return: current element index
         :rtype: integer or None
         """
+        self._snapshot()
         return self._index
 
+    def __len__(self):
+        return len(self._store)
+
+    def __getitem__(self, index):
+        return self._store.snapshot()[index]
+
+    def __iter__(self):
+        return iter(self._store.snapshot())
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, list(self))
+
 
 if __name__ == "__main__":
+    import sys
+    import threading
+    import time
     import unittest
 
     class TestDataFrame(unittest.TestCase):
@@ -177,5 +335,114 @@ if __name__ == "__main__":
 
             self.assertEqual(dframe.next_frame(), list(range(5, 10)))
 
+        def test_append(self):
+            """Appending to empty and chunked store."""
+            dframe = DataFrame()
+            dframe.granulate(5)
+            dframe.extend(range(3))
+            self.assertEqual(dframe.element_index, 0)
+            self.assertEqual(dframe.frame, [0, 1, 2])
+            dframe = DataFrame()
+            dframe.extend(range(3))
+            self.assertEqual(list(dframe.snapshot()), [0, 1, 2])
+            self.assertEqual(dframe._index, None)
+            self.assertEqual(dframe.element_index, 0)
+            store = EntryStore(range(10), chunk_size=4)
+            view = store.snapshot()
+            store.append(10)
+            self.assertEqual(list(view), list(range(10)))
+            self.assertEqual(view[3:6], [3, 4, 5])
+            self.assertEqual(view[-1], 9)
+            self.assertEqual(len(store), 11)
+
+    class TestConcurrency(unittest.TestCase):
+        """Writer thread appends while reader threads page and read."""
+        ROWS = 20000
+        READERS = 3
+        # Each checking thread must see the store grow this many times
+        MIN_LENGTHS = 20
+
+        def setUp(self):
+            # Switch threads often, so they really interleave
+            self._interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+
+        def tearDown(self):
+            sys.setswitchinterval(self._interval)
+
+        def test_stress(self):
+            """No torn rows and no inconsistent paging state."""
+            dframe = DataFrame()
+            dframe.granulate(7)
+            done = threading.Event()
+            start = threading.Barrier(self.READERS + 2)
+            errors = []
+            # Distinct store lengths seen by each checking thread
+            seen = []
+
+            def writer():
+                start.wait()
+                batch = []
+                for idx in range(self.ROWS):
+                    batch.append((idx, -idx))
+                    if len(batch) == 37:
+                        dframe.extend(batch)
+                        batch = []
+                        time.sleep(0)
+                dframe.extend(batch)
+                done.set()
+
+            def check(rows, start):
+                for idx, row in enumerate(rows, start):
+                    if row != (idx, -idx):
+                        errors.append("torn row {0}: {1!r}".format(idx, row))
+
+            def pager():
+                lengths = set()
+                seen.append(lengths)
+                start.wait()
+                while not done.is_set():
+                    lengths.add(len(dframe))
+                    dframe.move_next()
+                    dframe.next_frame()
+                    dframe.move_prev()
+                    findex = dframe.frame_index
+                    index = dframe.element_index
+                    frame = dframe.frame
+                    if not frame:
+                        continue
+                    check(frame, findex * 7)
+                    if findex >= dframe.frames_count() or \
+                            index // 7 != findex or \
+                            not 0 < len(frame) <= 7:
+                        errors.append("paging state: {0} {1} {2}".format(
+                            findex, index, len(frame)))
+
+            def reader():
+                lengths = set()
+                seen.append(lengths)
+                start.wait()
+                while not done.is_set():
+                    view = dframe.snapshot()
+                    lengths.add(len(view))
+                    tail = max(0, len(view) - 100)
+                    check(view[tail:], tail)
+
+            threads = [threading.Thread(target=writer),
+                       threading.Thread(target=pager)]
+            threads += [threading.Thread(target=reader)
+                        for _ in range(self.READERS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors[:5], [])
+            self.assertEqual(len(seen), self.READERS + 1)
+            for lengths in seen:
+                self.assertGreater(len(lengths), self.MIN_LENGTHS)
+            self.assertEqual(len(dframe), self.ROWS)
+            check(dframe, 0)
+            self.assertEqual(errors[:5], [])
+
     unittest.main()
-    sys.exit(0)
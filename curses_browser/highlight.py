@@ -0,0 +1,143 @@
+"""Regex match highlighting for rendered rows."""
+
+
+def merge_spans(spans, limit):
+    """Merge overlapping and adjacent spans, clipping them to limit.
+
+    :param spans: sorted (start, end) spans
+    :type spans: list
+
+    :param limit: end of visible text
+    :type limit: int
+
+    :rtype: list
+    """
+    merged = []
+    for start, end in spans:
+        if start >= limit:
+            break
+        end = min(end, limit)
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class Highlighter(object):
+    """Spans of regex pattern matches in rendered rows.
+    Compiled patterns are cached by source, match spans are cached per
+    entry and keyed by entry version, so scrolling back over visited pages
+    does not run the regex again.
+    Internals:
+        _patterns: compiled patterns by source
+        _pattern: current compiled pattern or None
+        _spans: (id(entry), version) -> (text, spans)
+    """
+
+    PATTERN_CACHE_SIZE = 32
+    SPAN_CACHE_SIZE = 4096
+
+    def __init__(self):
+        self._patterns = {}
+        self._pattern = None
+        self._spans = {}
+
+    def compile(self, pattern):
+        """Return compiled pattern from cache, compile on miss.
+        :param pattern: regular expression
+        :type pattern: str
+
+        :raise re.error: invalid pattern
+        :rtype: re.Pattern
+        """
+        compiled = self._patterns.get(pattern)
+        if compiled is None:
+            import re
+
+            if len(self._patterns) >= self.PATTERN_CACHE_SIZE:
+                self._patterns.clear()
+            compiled = self._patterns[pattern] = re.compile(pattern)
+        return compiled
+
+    def set_pattern(self, pattern):
+        """Set pattern to highlight, empty pattern disables highlighting.
+        :param pattern: regular expression
+        :type pattern: str
+
+        :raise re.error: invalid pattern
+        """
+        compiled = self.compile(pattern) if pattern else None
+        if compiled is not self._pattern:
+            self._pattern = compiled
+            self._spans.clear()
+
+    def spans(self, entry, text):
+        """Return (start, end) spans of non-empty matches in entry's text.
+        Same object is returned while cached, so callers may compare spans
+        by identity.
+        :param entry: rendered entry, its version attribute marks changes
+        :param text: entry's rendered text
+        :type text: str
+
+        :rtype: list
+        """
+        if self._pattern is None:
+            return ()
+        key = (id(entry), getattr(entry, "version", 0))
+        cached = self._spans.get(key)
+        # Same entry may be rendered differently, e.g. in table mode
+        if cached is not None and cached[0] == text:
+            return cached[1]
+        spans = [
+            match.span() for match in self._pattern.finditer(text)
+            if match.end() > match.start()]
+        if len(self._spans) >= self.SPAN_CACHE_SIZE:
+            self._spans.clear()
+        self._spans[key] = (text, spans)
+        return spans
+
+    @property
+    def pattern(self):
+        """Return current pattern source.
+        :rtype: str or None
+        """
+        return self._pattern.pattern if self._pattern is not None else None
+
+
+if __name__ == "__main__":
+    import re
+    import unittest
+
+    class Entry(object):
+        """Minimal versioned entry."""
+        version = 0
+
+    class TestHighlighter(unittest.TestCase):
+        """Basic test."""
+        def test_spans(self):
+            """Spans, caching and invalidation."""
+            highlighter = Highlighter()
+            entry = Entry()
+            self.assertEqual(highlighter.spans(entry, "abcab"), ())
+            highlighter.set_pattern("ab|x*")
+            spans = highlighter.spans(entry, "abcab")
+            self.assertEqual(spans, [(0, 2), (3, 5)])
+            self.assertIs(highlighter.spans(entry, "abcab"), spans)
+            self.assertEqual(highlighter.spans(entry, "cab"), [(1, 3)])
+            entry.version += 1
+            self.assertIsNot(highlighter.spans(entry, "cab"), spans)
+            compiled = highlighter.compile("ab|x*")
+            self.assertIs(highlighter.compile("ab|x*"), compiled)
+            highlighter.set_pattern("")
+            self.assertEqual(highlighter.pattern, None)
+            self.assertEqual(highlighter.spans(entry, "abcab"), ())
+            self.assertRaises(re.error, highlighter.set_pattern, "(")
+
+        def test_merge(self):
+            """Adjacent spans are merged and clipped."""
+            spans = [(0, 1), (1, 2), (4, 6), (5, 9), (12, 13)]
+            self.assertEqual(merge_spans(spans, 8), [(0, 2), (4, 8)])
+            self.assertEqual(merge_spans(spans, 0), [])
+
+    unittest.main()
@@ -0,0 +1,218 @@
+"""Column layout for table rendering of dict entries."""
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+
+class TableLayout(object):
+    """Aligned columns over chosen fields of entries.
+    Column widths are estimated from strided samples of the data and
+    cached, then only grow when wider values are fitted from the visible
+    page, so rows are never scanned in full. No more than SAMPLE_LIMIT
+    entries are sampled in total, however many batches are passed.
+    First column is frozen, other columns are paged horizontally.
+    Internals:
+        _columns: list of field names, first one is frozen
+        _widths: cached width of each column
+        _max_width: upper bound for a single column width
+        _offset: index of first scrollable column shown after frozen one
+        _sampled: number of entries sampled so far
+    """
+
+    SAMPLE_SIZE = 64
+    SAMPLE_LIMIT = 256
+    SEPARATOR = " | "
+
+    def __init__(self, columns, max_width=40):
+        if not columns:
+            raise ValueError("at least one column required")
+        self._columns = list(columns)
+        self._widths = [len(column) for column in self._columns]
+        self._max_width = max_width
+        self._offset = 1
+        self._sampled = 0
+
+    def _grow(self, cells):
+        """Widen cached widths to fit given row cells.
+        :param cells: row cells
+        :type cells: list
+        """
+        for idx, cell in enumerate(cells):
+            width = min(len(cell), self._max_width)
+            if width > self._widths[idx]:
+                self._widths[idx] = width
+
+    def _visible(self, width):
+        """Indexes of columns to show: frozen one plus a page from offset.
+        At least one scrollable column is shown even if it does not fit.
+        :param width: available width
+        :type width: int
+        :rtype: list
+        """
+        visible = [0]
+        used = self._widths[0]
+        for idx in range(self._offset, len(self._columns)):
+            used += len(self.SEPARATOR) + self._widths[idx]
+            if used > width and len(visible) > 1:
+                break
+            visible.append(idx)
+        return visible
+
+    def cells(self, entry):
+        """Return entry's cells for layout columns.
+        :param entry: entry providing cells()
+        :rtype: list
+        """
+        return entry.cells(self._columns)
+
+    def sample(self, entries):
+        """Estimate widths from at most SAMPLE_SIZE evenly strided entries.
+        Does nothing once SAMPLE_LIMIT entries are sampled in total.
+        :param entries: indexable sequence of entries
+        """
+        count = min(self.SAMPLE_SIZE, self.SAMPLE_LIMIT - self._sampled)
+        if count <= 0 or not len(entries):
+            return
+        # Ceiling division, so no more than count entries are read
+        step = max(1, -(-len(entries) // count))
+        for index in range(0, len(entries), step):
+            self._grow(self.cells(entries[index]))
+            self._sampled += 1
+
+    def fit(self, rows):
+        """Grow widths for rows that are about to be shown.
+        :param rows: list of row cells
+        :type rows: list
+        """
+        for cells in rows:
+            self._grow(cells)
+
+    def format(self, cells, width):
+        """Format row cells as aligned columns.
+        :param cells: row cells
+        :type cells: list
+
+        :param width: available width
+        :type width: int
+
+        :rtype: str
+        """
+        return self.SEPARATOR.join(
+            cells[idx][:self._widths[idx]].ljust(self._widths[idx])
+            for idx in self._visible(width))
+
+    def header(self, width):
+        """Format column names as aligned columns.
+        :param width: available width
+        :type width: int
+
+        :rtype: str
+        """
+        return self.format(self._columns, width)
+
+    def next_columns(self, width):
+        """Page scrollable columns right.
+        :param width: available width
+        :type width: int
+
+        :return: True if offset was changed
+        :rtype: bool
+        """
+        last = self._visible(width)[-1]
+        if last + 1 < len(self._columns):
+            self._offset = last + 1
+            return True
+        return False
+
+    def prev_columns(self, width):
+        """Page scrollable columns left.
+        :param width: available width
+        :type width: int
+
+        :return: True if offset was changed
+        :rtype: bool
+        """
+        used = self._widths[0]
+        idx = self._offset
+        while idx > 1:
+            used += len(self.SEPARATOR) + self._widths[idx - 1]
+            if used > width and idx < self._offset:
+                break
+            idx -= 1
+        changed = idx != self._offset
+        self._offset = idx
+        return changed
+
+    @property
+    def columns(self):
+        """Return column names.
+        :rtype: list
+        """
+        return list(self._columns)
+
+    @property
+    def widths(self):
+        """Return cached column widths.
+        :rtype: list
+        """
+        return list(self._widths)
+
+
+if __name__ == "__main__":
+    import unittest
+
+    class Row(object):
+        """Minimal entry."""
+        def __init__(self, **data):
+            self.data = data
+
+        def cells(self, columns):
+            return [str(self.data.get(column, "")) for column in columns]
+
+    class TestTableLayout(unittest.TestCase):
+        """Basic test."""
+        def test_widths(self):
+            """Widths from header, sample and fitted rows."""
+            layout = TableLayout(["id", "name"])
+            self.assertEqual(layout.widths, [2, 4])
+            layout.sample([Row(id=i, name="x" * 6) for i in range(1000)])
+            self.assertEqual(layout.widths, [3, 6])
+            layout.fit([layout.cells(Row(id=1, name="y" * 100))])
+            self.assertEqual(layout.widths, [3, 40])
+            layout.fit([layout.cells(Row(id=1, name=""))])
+            self.assertEqual(layout.widths, [3, 40])
+
+        def test_sample_size(self):
+            """No more than SAMPLE_SIZE entries are sampled."""
+            read = []
+
+            class CountedRow(Row):
+                def cells(self, columns):
+                    read.append(self)
+                    return Row.cells(self, columns)
+
+            layout = TableLayout(["id"])
+            layout.sample([CountedRow(id=i) for i in range(127)])
+            self.assertEqual(len(read), 64)
+            for _ in range(10):
+                layout.sample([CountedRow(id=i) for i in range(1000)])
+            self.assertEqual(len(read), layout.SAMPLE_LIMIT)
+            layout.sample([CountedRow(id=10 ** 6)])
+            self.assertEqual(layout.widths, [3])
+
+        def test_paging(self):
+            """Frozen first column and horizontal paging."""
+            layout = TableLayout(["a", "b", "c", "d"])
+            row = ["1", "2", "3", "4"]
+            self.assertEqual(layout.format(row, 100), "1 | 2 | 3 | 4")
+            self.assertEqual(layout.format(row, 9), "1 | 2 | 3")
+            self.assertTrue(layout.next_columns(9))
+            self.assertEqual(layout.format(row, 9), "1 | 4")
+            self.assertFalse(layout.next_columns(9))
+            self.assertTrue(layout.prev_columns(9))
+            self.assertEqual(layout.format(row, 9), "1 | 2 | 3")
+            self.assertFalse(layout.prev_columns(9))
+
+    unittest.main()
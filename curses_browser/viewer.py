@@ -1,14 +1,16 @@
 """Curses list data viewer."""
 
 import curses
-import functools
+import itertools
 import os
+import sys
 import time
-import traceback
-from pprint import pprint
 from curses import A_NORMAL, A_BOLD
 
+from curses_browser import _IMPORT_START, perf_counter
 from curses_browser.dataframe import DataFrame
+from curses_browser.highlight import Highlighter, merge_spans
+from curses_browser.table import TableLayout
 
 
 def to_string(entry):
@@ -27,17 +29,31 @@ class DictEntry(object):
         self._data = data
         self._template = template
         self._checked = checked
+        # Bumped on every change of rendered text
+        self.version = 0
 
     def __str__(self):
         return self._template.format(
             checked="*" if self._checked else " ",
             **self._data)
 
+    def cells(self, columns):
+        """Return data fields as strings for given columns."""
+        return [str(self._data.get(column, "")) for column in columns]
+
+    @property
+    def checked(self):
+        return self._checked
+
     def toggle_check(self):
         self._checked = not self._checked
+        self.version += 1
+
 
+PLACEHOLDER = "[...]"
 
-def shorten(text, width, placeholder="[...]", cut_placeholder=True):
+
+def shorten(text, width, placeholder=PLACEHOLDER, cut_placeholder=True):
     """Collapse and truncate the given text to fit in the given width.
 
     :param text: text for shortening
@@ -83,6 +99,8 @@ def init_curses():
     curses.init_pair(1, curses.COLOR_BLACK, curses.COLOR_CYAN)
     # Error string color
     curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)
+    # Search match color
+    curses.init_pair(3, curses.COLOR_BLACK, curses.COLOR_YELLOW)
     screen.border(0)
     curses.curs_set(0)
     return screen
@@ -104,26 +122,25 @@ def deinit_curses(screen):
 def key(keycode, keymap):
     def decorator(func):
         keymap[keycode] = func
-
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
-        return wrapper
+        return func
     return decorator
 
 
 class PlanMenu(object):
 
     SLEEP_TIME = 0.03
+    LOAD_BATCH = 1000
 
     KEYMAP = dict()
     KEY_ESC = 27
     KEY_ENTER = ord("\n")
     KEY_SPACE = ord(" ")
+    KEY_COLUMNS_NEXT = ord(">")
+    KEY_COLUMNS_PREV = ord("<")
+    KEY_SEARCH = ord("/")
 
-    def __init__(self, data, filename):
-        self._dframe = DataFrame(data)
-        self._filename = filename
+    def __init__(self, data, filename, columns=None):
+        self._init_data(data, filename, columns)
 
         self._screen = init_curses()
 
@@ -131,15 +148,46 @@ class PlanMenu(object):
         self._box = None
         self._max_y = None
         self._max_x = None
+        self._page_len = None
+        self._drawn = None
         self._resize()
 
+        setup_start = perf_counter()
+        self._load(self._page_len)
+        self._setup_time = perf_counter() - setup_start
+        self._first_paint = None
+
         self._pos_y = 1
         self._running = False
+
+    def _init_data(self, data, filename, columns):
+        """Set up data, layout and message state, no terminal is needed.
+
+        :param data: iterable of entries
+        :type data: iterable
+
+        :param filename: file to save checked entries to
+        :type filename: str
+
+        :param columns: field names for table mode or None
+        :type columns: list
+        """
+        # Data is consumed lazily: first page here, the rest between frames
+        self._pending = iter(data)
+        self._dframe = DataFrame()
+        self._filename = filename
+
+        # Table mode renders chosen data fields as aligned columns
+        self._table = TableLayout(columns) if columns else None
+
+        self._highlighter = Highlighter()
+
+        # Style is set with every message, curses colors aren't ready yet
         self._message = {
             "msg": "",
             "default_counter": 80,
             "counter": 80,
-            "style": curses.color_pair(2) | A_BOLD}
+            "style": A_NORMAL}
 
     def _resize(self):
         """Handle terminal resizing."""
@@ -147,12 +195,15 @@ class PlanMenu(object):
         border = (scrsize[0] - 2, scrsize[1] - 2)
         self._box = curses.newwin(border[0], border[1], 1, 1)
         self._box.box()
+        # Rows on screen: pos_y -> (string, style, spans), new box is blank
+        self._drawn = {}
 
         self._max_y = border[0] - 2
         self._max_x = border[1] - 2
 
-        # Last string will be footer
-        self._dframe.granulate(self._max_y - 1)
+        # Last string will be footer, first one is header in table mode
+        self._page_len = self._max_y - 1 - (1 if self._table else 0)
+        self._dframe.granulate(self._page_len)
         self._pos_y = 1  # TODO: DataFrame.granulate sets all indexes to 0
         # TODO: make this clearer
         if self._max_x >= 4 and self._max_y >= 4:
@@ -160,6 +211,28 @@ class PlanMenu(object):
         else:
             self._screen.clear()
 
+    def _load(self, count):
+        """Move up to count entries from pending data to DataFrame.
+
+        :param count: number of entries to load
+        :type count: int
+
+        :return: True if pending data remains
+        :rtype: bool
+        """
+        if self._pending is None:
+            return False
+        count = max(count, 1)
+        batch = list(itertools.islice(self._pending, count))
+        if len(batch) < count:
+            self._pending = None
+        if batch:
+            self._dframe.extend(batch)
+            # Layout stops sampling after SAMPLE_LIMIT entries in total
+            if self._table:
+                self._table.sample(batch)
+        return self._pending is not None
+
     def _notify(self, msg="", style=A_NORMAL):
         """Update message with notification.
 
@@ -196,8 +269,8 @@ class PlanMenu(object):
         # filtered = itertools.takewhile(lambda x: x["checked"], self._dframe)
         try:
             for entry in self._dframe:
-                if entry["checked"]:
-                    file_.write(entry + "\n")
+                if entry.checked:
+                    file_.write(str(entry) + "\n")
         except IOError:
             self._error("Can't save file")
         else:
@@ -207,7 +280,7 @@ class PlanMenu(object):
     def move_down(self):
         """Move cursor line down."""
         if self._dframe.element_index < len(self._dframe) - 1:
-            if self._pos_y > self._max_y - 2:
+            if self._pos_y >= self._page_len:
                 self._pos_y = 1
             else:
                 self._pos_y += 1
@@ -217,7 +290,7 @@ class PlanMenu(object):
     def move_up(self):
         """Move cursor line up."""
         if self._dframe.frame_index > 0 and self._pos_y == 1:
-            self._pos_y = self._max_y - 1
+            self._pos_y = self._page_len
         elif self._pos_y > 1:
             self._pos_y -= 1
         self._dframe.move_prev()
@@ -240,6 +313,59 @@ class PlanMenu(object):
         if self._pos_y > len(self._dframe.frame):
             self._pos_y = len(self._dframe.frame)
 
+    @key(KEY_COLUMNS_NEXT, KEYMAP)
+    def next_columns(self):
+        """Next page of table columns."""
+        if self._table:
+            self._table.next_columns(self._max_x - 4)
+
+    @key(KEY_COLUMNS_PREV, KEYMAP)
+    def prev_columns(self):
+        """Previous page of table columns."""
+        if self._table:
+            self._table.prev_columns(self._max_x - 4)
+
+    def _prompt(self, prompt):
+        """Read line of text in footer.
+
+        :param prompt: text before input
+        :type prompt: str
+
+        :return: entered text
+        :rtype: str
+        """
+        self._box.addstr(self._max_y, 2, " " * (self._max_x - 2))
+        self._box.addstr(self._max_y, 2, prompt)
+        curses.echo()
+        curses.curs_set(1)
+        try:
+            text = self._box.getstr(
+                self._max_y, 2 + len(prompt), self._max_x - len(prompt) - 2)
+        finally:
+            curses.noecho()
+            curses.curs_set(0)
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", "replace")
+        return text
+
+    def search(self, pattern):
+        """Highlight regex pattern matches in rows, empty pattern clears.
+
+        :param pattern: regular expression
+        :type pattern: str
+        """
+        import re
+
+        try:
+            self._highlighter.set_pattern(pattern)
+        except re.error as exc:
+            self._error("Bad pattern: {0}".format(exc))
+
+    @key(KEY_SEARCH, KEYMAP)
+    def prompt_search(self):
+        """Ask for pattern to highlight."""
+        self.search(self._prompt("/"))
+
     def _toggle_check(self, move_down=False):
         """Toggle element's checkbox."""
         if len(self._dframe):
@@ -264,29 +390,113 @@ class PlanMenu(object):
     @key(curses.KEY_F5, KEYMAP)
     def save(self):
         """Save to file."""
+        while self._load(self.LOAD_BATCH):
+            pass
         with open(self._filename, "w") as file_:
             self._save_file(file_)
 
-    def events(self):
-        """Handle key events."""
-        key = self._screen.getch()
-        action = self.KEYMAP.get(key)
+    def _handle_key(self, keycode):
+        """Run action bound to key.
+
+        :param keycode: curses key code
+        :type keycode: int
+        """
+        action = self.KEYMAP.get(keycode)
         if action:
             action(self)
 
+    def events(self):
+        """Handle key events."""
+        self._handle_key(self._screen.getch())
+
+    def _draw_row(self, pos_y, string, style=A_NORMAL, spans=(), limit=0):
+        """Draw row unless it is already on screen as is.
+
+        Row is written once and match spans get their attribute with chgat.
+        Spans are compared by identity, Highlighter returns cached lists.
+
+        :param pos_y: row position in box
+        :type pos_y: int
+
+        :param string: text fitting the box
+        :type string: str
+
+        :param style: terminal string style
+        :type style: int
+
+        :param spans: (start, end) spans to highlight
+        :type spans: list
+
+        :param limit: highlight nothing from this position on
+        :type limit: int
+        """
+        drawn = self._drawn.get(pos_y)
+        if drawn is not None and drawn[0] == string and \
+                drawn[1] == style and drawn[2] is spans:
+            return
+        self._drawn[pos_y] = (string, style, spans)
+        self._box.addstr(pos_y, 2, string.ljust(self._max_x - 1), style)
+        match_style = curses.color_pair(3) | A_BOLD
+        chgat = self._box.chgat
+        for start, end in merge_spans(spans, limit):
+            chgat(pos_y, 2 + start, end - start, match_style)
+
     def _update_content(self):
-        """Update box's content."""
+        """Update box's content, redrawing only changed rows."""
+        shown = set()
+        try:
+            self._update_rows(shown)
+        finally:
+            for pos_y in list(self._drawn):
+                if pos_y not in shown:
+                    self._box.addstr(pos_y, 1, " " * self._max_x)
+                    del self._drawn[pos_y]
+
+    def _update_rows(self, shown):
+        """Draw content rows.
+
+        :param shown: set to fill with positions of drawn rows
+        :type shown: set
+        """
         if not len(self._dframe):
-            self._box.addstr(2, 2, shorten("No data available", self._max_x))
+            shown.add(2)
+            self._draw_row(2, shorten("No data available", self._max_x))
             return
 
-        for idy, entry in enumerate(self._dframe.frame, 1):
+        frame = self._dframe.frame
+        top = 1
+        if self._table:
+            # Checkbox column takes 4 chars
+            width = self._max_x - 4
+            rows = [self._table.cells(entry) for entry in frame]
+            self._table.fit(rows)
+            lines = [
+                "[{0}] {1}".format(
+                    "*" if entry.checked else " ",
+                    self._table.format(cells, width))
+                for entry, cells in zip(frame, rows)]
+            header = "    " + self._table.header(width)
+            shown.add(top)
+            self._draw_row(top, shorten(header, self._max_x), A_BOLD)
+            top += 1
+        else:
+            lines = [str(entry) for entry in frame]
+
+        for idy, (entry, line) in enumerate(zip(frame, lines), 1):
             if idy == self._pos_y:
                 style = curses.color_pair(1)
             else:
                 style = curses.A_NORMAL
-            string = shorten(str(entry), self._max_x)
-            self._box.addstr(idy, 2, string, style)
+            string = shorten(line, self._max_x)
+            # Don't highlight matches under shortening placeholder
+            limit = len(string)
+            if string != line:
+                limit = max(0, limit - len(PLACEHOLDER))
+            pos_y = top + idy - 1
+            shown.add(pos_y)
+            self._draw_row(
+                pos_y, string, style,
+                self._highlighter.spans(entry, line), limit)
 
     def _update_footer(self):
         """Update box's footer."""
@@ -305,6 +515,8 @@ class PlanMenu(object):
                     self._message["counter"] = self._message["default_counter"]
 
         left = "Save: F1  Exit: ESC  Nav: arrows  Toggle: enter"
+        if self._table:
+            left += "  Columns: < >"
         left_pos = (self._max_y, 2)
 
         center = "PAGE: [{0}/{1}]".format(
@@ -316,6 +528,8 @@ class PlanMenu(object):
         right = self._message["msg"]
         right_pos = (self._max_y, self._max_x - len(right) - 2)
 
+        # Box isn't erased between frames, clear footer line
+        addstr(self._max_y, 1, " " * self._max_x)
         addstr(*left_pos, string=left)
         addstr(*center_pos, string=center)
         addstr(*right_pos, string=right, style=self._message["style"])
@@ -329,10 +543,21 @@ class PlanMenu(object):
         """Render content to screen."""
         self._screen.refresh()
         self._box.refresh()
-        self._box.erase()
         # XXX: Resize handling. Need more to test to rewrite
         if self._max_x > 2 and self._max_y > 2:
             self._box.border(0)
+        if self._first_paint is None:
+            self._first_paint = perf_counter()
+
+    def _run(self):
+        """Poll events and redraw until stopped."""
+        while self._running:
+            self.events()
+            self.update()
+            self.render()
+            # Load rest of data between frames, sleep once it is loaded
+            if not self._load(self.LOAD_BATCH):
+                time.sleep(self.SLEEP_TIME)
 
     def loop(self):
         """Main loop."""
@@ -340,12 +565,11 @@ class PlanMenu(object):
             self._running = True
 
         try:
-            while self._running:
-                self.events()
-                self.update()
-                self.render()
-                time.sleep(self.SLEEP_TIME)
+            self._run()
         except Exception:
+            import traceback
+            from pprint import pprint
+
             deinit_curses(self._screen)
             traceback.print_exc()
             pprint(vars(self))
@@ -354,20 +578,161 @@ class PlanMenu(object):
         deinit_curses(self._screen)
         return os.EX_OK
 
+    @property
+    def setup_time(self):
+        """Return time spent on loading first page of data.
+
+        :rtype: float
+        """
+        return self._setup_time
+
+    @property
+    def first_paint(self):
+        """Return perf_counter() value of first render or None.
+
+        :rtype: float or None
+        """
+        return self._first_paint
+
+
+def report_startup(plan_menu, file_=None):
+    """Write startup timings to file (stderr by default).
+
+    Import and first paint are measured from the moment curses_browser
+    package starts importing, interpreter startup is not included.
+
+    :param plan_menu: plan menu after its loop
+    :type plan_menu: PlanMenu
+
+    :param file_: file object for report
+    :type file_: file
+    """
+    file_ = file_ or sys.stderr
+
+    def msec(seconds):
+        return "{0:.1f} ms".format(seconds * 1000)
+
+    if plan_menu.first_paint is None:
+        first_paint = "n/a"
+    else:
+        first_paint = msec(plan_menu.first_paint - _IMPORT_START)
+    file_.write(
+        "import (since package import): {0}\n"
+        "data setup: {1}\n"
+        "time to first paint (since package import): {2}\n".format(
+            msec(_IMPORT_END - _IMPORT_START),
+            msec(plan_menu.setup_time),
+            first_paint))
+
 
 def main():
+    """Run demo plan menu.
+
+    Command line switches:
+        --startup-profile: write startup timings to stderr on exit
+        --test: run this module's tests instead, must be the first argument
 
-    data = [
+    :return: exit status
+    :rtype: int
+    """
+    profile = "--startup-profile" in sys.argv[1:]
+
+    # Generator: entries are built only when they are about to be shown
+    data = (
         DictEntry(item, checked, "{indent} [{checked}] {text}")
-        for item, checked in [({
+        for item, checked in (({
             "text": "lorem ipsum {0}".format(i),
             "indent": "" if i % 4 == 0 else "    ",
-        }, i % 3 == 0) for i in range(150)]
-    ]
+        }, i % 3 == 0) for i in range(150))
+    )
 
     plan_menu = PlanMenu(data, "testfile.txt")
-    plan_menu.loop()
+    status = plan_menu.loop()
+    if profile:
+        report_startup(plan_menu)
+    return status
+
+
+_IMPORT_END = perf_counter()
 
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] != ["--test"]:
+        sys.exit(main())
+    del sys.argv[1]
+
+    import io
+    import shutil
+    import tempfile
+    import unittest
+
+    class Menu(PlanMenu):
+        """PlanMenu without terminal, for data loading only."""
+        LOAD_BATCH = 4
+
+        def __init__(self, data, filename, page_len):
+            self._init_data(data, filename, None)
+            self._load(page_len)
+
+    class TestLoading(unittest.TestCase):
+        """Lazy data loading."""
+        def test_exact_page(self):
+            """Data exactly one page long."""
+            menu = Menu(range(10), None, 10)
+            self.assertEqual(len(menu._dframe), 10)
+            self.assertFalse(menu._load(menu.LOAD_BATCH))
+            self.assertEqual(list(menu._dframe), list(range(10)))
+
+        def test_short_page(self):
+            """Data shorter than a page is loaded at once."""
+            menu = Menu(range(3), None, 10)
+            self.assertFalse(menu._load(menu.LOAD_BATCH))
+            self.assertEqual(len(menu._dframe), 3)
+
+        def test_batches(self):
+            """Rest of data is loaded in LOAD_BATCH batches, in order."""
+            menu = Menu(range(18), None, 10)
+            self.assertEqual(len(menu._dframe), 10)
+            loads = [menu._load(menu.LOAD_BATCH) for _ in range(3)]
+            self.assertEqual(loads, [True, True, False])
+            self.assertEqual(list(menu._dframe), list(range(18)))
+
+        def test_save(self):
+            """Saving loads pending data first."""
+            tmpdir = tempfile.mkdtemp()
+            try:
+                filename = tempfile.mktemp(dir=tmpdir)
+                data = [DictEntry({"text": str(i)}, i % 3 == 0, "{text}")
+                        for i in range(25)]
+                menu = Menu(data, filename, 5)
+                menu.save()
+                self.assertEqual(len(menu._dframe), 25)
+                with open(filename) as file_:
+                    self.assertEqual(
+                        file_.read().split(),
+                        [str(i) for i in range(0, 25, 3)])
+            finally:
+                shutil.rmtree(tmpdir)
+
+    class TestReport(unittest.TestCase):
+        """Startup report."""
+        def test_report(self):
+            """Report fields."""
+            class Profiled(object):
+                setup_time = 0.002
+                first_paint = _IMPORT_START + 0.05
+
+            output = io.StringIO()
+            report_startup(Profiled(), output)
+            lines = output.getvalue().splitlines()
+            since = " (since package import): "
+            self.assertTrue(lines[0].startswith("import" + since))
+            self.assertEqual(lines[1], "data setup: 2.0 ms")
+            self.assertEqual(lines[2], "time to first paint" + since + "50.0 ms")
+
+            Profiled.first_paint = None
+            output = io.StringIO()
+            report_startup(Profiled(), output)
+            self.assertTrue(output.getvalue().endswith(since + "n/a\n"))
+
+    unittest.main()